@@ -1,24 +1,71 @@
 import anthropic
+import asyncio
+import httpx
 import os
 from typing import Optional
 from dotenv import load_dotenv
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
 
 # 載入環境變數
 load_dotenv()
 
+# 預設的生成模型；使用 alias 而非特定 snapshot，避免 snapshot 退役後請求失敗
+GENERATION_MODEL = "claude-sonnet-4-5"
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Create an HTTP/2 connection pool that the Claude and OpenAI clients can share,
+    so concurrent requests reuse connections instead of repeating TCP/TLS handshakes.
+    The pool is bound to the running event loop; close it (e.g. ``async with``) before the loop ends.
+
+    :return: A configured httpx.AsyncClient
+    """
+    return httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+        timeout=httpx.Timeout(600.0, connect=5.0)
+    )
+
+def is_retryable_error(error: BaseException) -> bool:
+    """
+    Whether a Claude request error is transient and worth retrying:
+    connection errors, 429 rate limits and any 5xx (including 529 overloaded,
+    which the SDK raises as OverloadedError rather than InternalServerError)
+
+    :param error: The exception raised by the Anthropic SDK
+    :return: True if the request should be retried
+    """
+    if isinstance(error, anthropic.APIConnectionError):
+        return True
+    return isinstance(error, anthropic.APIStatusError) and (error.status_code == 429 or error.status_code >= 500)
+
 class ClaudeAPI:
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, http_client: Optional[httpx.AsyncClient] = None):
         """
         Initialize the Claude API client
         :param api_key: Anthropic API key. If not provided, will look for CLAUDE_API_KEY environment variable
+        :param http_client: HTTP client to send requests with (see create_http_client). Defaults to the SDK's own client
         """
         self.api_key = api_key or os.getenv("claude_api_key")
         if not self.api_key:
             raise ValueError("API key must be provided either directly or through claude_api_key environment variable")
         
-        self.client = anthropic.Anthropic(api_key=self.api_key)
+        self.client = anthropic.AsyncAnthropic(
+            api_key=self.api_key,
+            http_client=http_client,
+            max_retries=0  # 重試交由 get_completion 的 tenacity 設定處理
+        )
+        # 累計 prompt cache 使用量，用於確認 system prompt 快取命中率
+        self.cache_stats = {"cache_creation_input_tokens": 0, "cache_read_input_tokens": 0, "input_tokens": 0}
         
-    def get_completion(self, system_prompt: str, user_prompt: str, model: str = "claude-3-opus-20240229", max_tokens: int = 1000) -> str:
+    # 僅在 rate limit (429)、伺服器錯誤 (5xx，含 529 overloaded) 與連線錯誤時以指數退避重試
+    @retry(
+        retry=retry_if_exception(is_retryable_error),
+        wait=wait_exponential(multiplier=1, max=30),
+        stop=stop_after_attempt(6),
+        reraise=True
+    )
+    async def get_completion(self, system_prompt: str, user_prompt: str, model: str = GENERATION_MODEL, max_tokens: int = 1000) -> str:
         """
         Get completion from Claude using system and user prompts
         
@@ -28,25 +75,47 @@ class ClaudeAPI:
         :param max_tokens: Maximum number of tokens in the response
         :return: Claude's response
         """
-        try:
-            message = self.client.messages.create(
-                max_tokens=max_tokens,
-                model=model,
-                system=system_prompt,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": user_prompt
-                    }
-                ],
-                temperature=0
-            )
-            return message.content[0].text
-            
-        except Exception as e:
-            raise Exception(f"Error getting completion from Claude: {str(e)}")
-
-def main():
+        message = await self.client.messages.create(
+            max_tokens=max_tokens,
+            model=model,
+            # 以 cache_control 標記 system prompt，重複呼叫時可命中 Anthropic 的 prompt cache
+            system=[
+                {
+                    "type": "text",
+                    "text": system_prompt,
+                    "cache_control": {"type": "ephemeral"}
+                }
+            ],
+            messages=[
+                {
+                    "role": "user",
+                    "content": user_prompt
+                }
+            ],
+            temperature=0
+        )
+        self._record_usage(message.usage)
+        return message.content[0].text
+
+    def _record_usage(self, usage) -> None:
+        """
+        Accumulate token usage, including prompt cache reads and writes
+
+        :param usage: The usage object returned with a message
+        """
+        for key in self.cache_stats:
+            self.cache_stats[key] += getattr(usage, key, None) or 0
+
+    def cache_hit_rate(self) -> float:
+        """
+        Fraction of prompt input tokens served from the prompt cache
+
+        :return: Cache read tokens divided by all input tokens (0 if nothing was sent)
+        """
+        total = sum(self.cache_stats.values())
+        return self.cache_stats["cache_read_input_tokens"] / total if total else 0.0
+
+async def main():
     # Example usage
     claude = ClaudeAPI()  # Will use environment variable
     
@@ -54,10 +123,10 @@ def main():
     user_prompt = "What is the capital of France?"
     
     try:
-        response = claude.get_completion(system_prompt, user_prompt)
+        response = await claude.get_completion(system_prompt, user_prompt)
         print(f"Claude's response: {response}")
     except Exception as e:
         print(f"Error: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
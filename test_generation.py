@@ -1,18 +1,113 @@
-from claude import ClaudeAPI
+from claude import GENERATION_MODEL, ClaudeAPI, create_http_client
+import asyncio
+import hashlib
+import httpx
+import io
 import json
+import mmap
+import orjson
 import os
-from typing import Dict, Any
-from openai import OpenAI
+import string
+import sys
+from typing import Dict, Any, List, Optional, Tuple, TextIO
+from functools import cached_property
+from openai import APIConnectionError, AsyncOpenAI, InternalServerError, RateLimitError
 from dotenv import load_dotenv
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
+
+try:
+    import uvloop
+except ImportError:  # uvloop 不支援 Windows，改用預設的 event loop
+    uvloop = None
 
 # 載入環境變數
 load_dotenv()
 
+# 固定的 prompt cache key，讓 OpenAI 將相同前綴的請求導向同一快取節點
+EVALUATION_SESSION_ID = "prompt_evaluate-content_evaluation"
+
+EVALUATION_MODEL = "gpt-4o-mini-2024-07-18"
+
+# prompt 檔案超過此大小時以 mmap 直接交給 orjson 解析，小檔案直接讀取即可
+PROMPT_MMAP_THRESHOLD = 64 * 1024
+
+# 批次評估時附加在 user message 開頭的固定說明；各項目不重複單份評估模板，因此在此明確列出輸出格式
+BATCH_EVALUATION_INSTRUCTION = """以下包含多份待評估的內容，每份以 "### Item <index>" 開頭，並列出原始任務與待評估內容。
+請依照評估標準分別評估每一份內容，評分範圍為 0-10，並回傳以下格式的 JSON 物件：
+{
+  "results": [
+    {
+      "index": <項目編號 (整數)>,
+      "scores": {"相關性": <分數>, "清晰性": <分數>, "完整性": <分數>, "可執行性": <分數>},
+      "reasons": {"相關性": "<理由>", "清晰性": "<理由>", "完整性": "<理由>", "可執行性": "<理由>"},
+      "suggestions": ["<改進建議>", ...],
+      "consistency_check": "<與原始任務的一致性檢查>",
+      "overall_score": <總分>
+    }
+  ]
+}
+results 陣列需包含每一個項目，且每個元素都必須具備上述所有欄位。"""
+
+# 批次評估中每個項目的格式
+BATCH_EVALUATION_ITEM_TEMPLATE = "### Item {index}\n原始任務: {original_task}\n待評估內容:\n{content}"
+
+# 有效的評估結果必須包含的欄位，缺少時不寫入快取
+REQUIRED_EVALUATION_KEYS = ("scores", "overall_score")
+
+class CompiledTemplate:
+    _CONVERSIONS = {"r": repr, "s": str, "a": ascii}
+    
+    def __init__(self, template: str):
+        """
+        預先解析的 str.format 模板，render 時只做欄位替換而不再掃描模板
+        :param template: str.format 格式的模板字串
+        """
+        self.template = template
+        self._parts = list(string.Formatter().parse(template))
+        # 欄位名稱含屬性/索引存取或巢狀格式時，交回 str.format 處理
+        self._simple = all(
+            field is None or (field.isidentifier() and "{" not in spec)
+            for _, field, spec, _ in self._parts
+        )
+    
+    def render(self, **kwargs) -> str:
+        """以參數填入模板，行為與 str.format(**kwargs) 相同"""
+        if not self._simple:
+            return self.template.format(**kwargs)
+        pieces = []
+        for literal, field, spec, conversion in self._parts:
+            pieces.append(literal)
+            if field is not None:
+                value = kwargs[field]
+                if conversion:
+                    value = self._CONVERSIONS[conversion](value)
+                pieces.append(format(value, spec))
+        return "".join(pieces)
+
 class PromptManager:
     def __init__(self, prompt_file: str):
         """初始化 Prompt 管理器"""
-        with open(prompt_file, 'r', encoding='utf-8') as f:
-            self.prompts = json.load(f)
+        self.prompt_file = prompt_file
+        with open(prompt_file, 'rb') as f:
+            if os.fstat(f.fileno()).st_size > PROMPT_MMAP_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+                    self.prompts = orjson.loads(view)
+            else:
+                self.prompts = orjson.loads(f.read())
+        
+        # 預先攤平巢狀結構，避免每次呼叫都逐層查找 dict
+        self._system_prompts: Dict[Tuple[str, Optional[str], Optional[str]], str] = {}
+        self._templates: Dict[Tuple[str, str], CompiledTemplate] = {}
+        for category, section in self.prompts.items():
+            if not isinstance(section, dict):
+                continue
+            if "system_prompt" in section:
+                self._system_prompts[(category, None, None)] = section["system_prompt"]
+            for prompt_type, styles in section.get("system_prompts", {}).items():
+                for style, prompt in styles.items():
+                    self._system_prompts[(category, prompt_type, style)] = prompt
+            for template_name, template in section.get("user_prompt_templates", {}).items():
+                self._templates[(category, template_name)] = CompiledTemplate(template["template"])
     
     def get_system_prompt(self, category: str, prompt_type: str = None, style: str = "comprehensive") -> str:
         """
@@ -22,8 +117,8 @@ class PromptManager:
         :param style: 提示詞風格 (comprehensive 或 concise)
         """
         if category == "content_generation":
-            return self.prompts[category]["system_prompts"][prompt_type][style]
-        return self.prompts[category]["system_prompt"]
+            return self._system_prompts[(category, prompt_type, style)]
+        return self._system_prompts[(category, None, None)]
     
     def get_user_prompt(self, category: str, template_name: str, **kwargs) -> str:
         """
@@ -32,33 +127,93 @@ class PromptManager:
         :param template_name: 模板名稱
         :param kwargs: 模板參數
         """
-        template = self.prompts[category]["user_prompt_templates"][template_name]["template"]
-        return template.format(**kwargs)
+        return self._templates[(category, template_name)].render(**kwargs)
+
+class EvalCache:
+    def __init__(self, cache_dir: str = ".cache", version: str = ""):
+        """
+        以輸入內容的 SHA-256 為鍵的磁碟快取，用於重複執行時略過相同的 API 呼叫
+        :param cache_dir: 快取根目錄
+        :param version: 快取版本 (如 prompt 檔案的修改時間)，變更後舊的快取即失效
+        """
+        self.cache_dir = cache_dir
+        self.version = version
+    
+    @classmethod
+    def for_prompt_file(cls, prompt_file: str, cache_dir: str = ".cache") -> "EvalCache":
+        """以 prompt 檔案的修改時間作為版本，修改 prompt 後自動失效"""
+        return cls(cache_dir, version=str(os.path.getmtime(prompt_file)))
+    
+    def make_key(self, *parts: str) -> str:
+        """由版本與輸入字串計算快取鍵"""
+        return hashlib.sha256("\0".join((self.version,) + parts).encode("utf-8")).hexdigest()
+    
+    def _path(self, namespace: str, key: str) -> str:
+        return os.path.join(self.cache_dir, namespace, f"{key}.json")
+    
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """讀取快取，未命中或檔案損毀時回傳 None"""
+        try:
+            with open(self._path(namespace, key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+    
+    def set(self, namespace: str, key: str, value: Any) -> None:
+        """寫入快取，先寫入暫存檔再替換以避免並行寫入產生不完整的檔案"""
+        path = self._path(namespace, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
 
 class ContentEvaluator:
-    def __init__(self, prompt_manager: PromptManager):
-        """初始化 API clients"""
-        self.claude = ClaudeAPI()
-        self.openai = OpenAI(api_key=os.getenv("chatgpt_api_key"))
+    def __init__(self, prompt_manager: PromptManager, cache: Optional[EvalCache] = None, http_client: Optional[httpx.AsyncClient] = None):
+        """
+        初始化評估器，API clients 於第一次使用時才建立
+        :param prompt_manager: Prompt 管理器
+        :param cache: 磁碟快取，None 表示不使用
+        :param http_client: Claude 與 OpenAI 共用的連線池 (見 create_http_client)，None 時各自使用 SDK 預設 client
+        """
         self.prompt_manager = prompt_manager
+        self.cache = cache
+        self.http_client = http_client
+        # 進行中的生成請求，相同 prompt 的並行呼叫共用同一個 task
+        self._inflight: Dict[Tuple[str, str, str], asyncio.Task] = {}
+        # 評估用的 system prompt 只計算一次，確保每次請求的前綴完全相同以命中 OpenAI prompt cache
+        self.evaluation_system_prompt = prompt_manager.get_system_prompt("content_evaluation")
+        self.openai_cache_stats = {"prompt_tokens": 0, "cached_tokens": 0}
+        
+    @cached_property
+    def claude(self) -> ClaudeAPI:
+        """Claude client，第一次存取時建立"""
+        return ClaudeAPI(http_client=self.http_client)
+    
+    @cached_property
+    def openai(self) -> AsyncOpenAI:
+        """OpenAI client，第一次存取時建立"""
+        return AsyncOpenAI(
+            api_key=os.getenv("chatgpt_api_key"),
+            http_client=self.http_client,
+            max_retries=0  # 重試交由 _request_evaluation 的 tenacity 設定處理
+        )
         
-    def generate_content(self, data: Dict[str, Any], prompt_type: str = "enrich_task", style: str = "comprehensive") -> str:
+    async def generate_content(self, data: Dict[str, Any], prompt_type: str = "enrich_task", style: str = "comprehensive", model: str = GENERATION_MODEL) -> str:
         """
         使用 Claude 生成內容
         :param data: 輸入數據
         :param prompt_type: 使用的提示詞類型
         :param style: 提示詞風格 (comprehensive 或 concise)
+        :param model: 使用的 Claude 模型
         """
         system_prompt = self.prompt_manager.get_system_prompt("content_generation", prompt_type, style)
         
-        # 處理父任務/Epic 資訊
-        parent_info = ""
+        # 處理父任務/Epic 資訊，以精簡格式減少輸入 token
         if "parent" in data:
-            parent_info = f"""Parent/Epic:
-Title: {data['parent']['title']}
-Description: {data['parent']['description']}"""
+            parent_info = f"Parent: {data['parent']['title']} | {data['parent']['description']}"
         else:
-            parent_info = "No parent or epic information available."
+            parent_info = "Parent: none"
         
         user_prompt = self.prompt_manager.get_user_prompt(
             "content_generation",
@@ -68,10 +223,29 @@ Description: {data['parent']['description']}"""
             parent_info=parent_info
         )
         
-        return self.claude.get_completion(system_prompt, user_prompt)
+        if self.cache is not None:
+            cache_key = self.cache.make_key(system_prompt, user_prompt, model)
+            cached = self.cache.get("generate", cache_key)
+            if cached is not None:
+                return cached
+        
+        key = (system_prompt, user_prompt, model)
+        task = self._inflight.get(key)
+        is_owner = task is None
+        if is_owner:
+            task = asyncio.create_task(self.claude.get_completion(system_prompt, user_prompt, model=model))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        
+        # shield 避免單一呼叫端被取消時連帶取消其他呼叫端共用的請求
+        content = await asyncio.shield(task)
+        if is_owner and self.cache is not None:
+            self.cache.set("generate", cache_key, content)
+        return content
     
-    def evaluate_content(self, content: str, original_task: str = None) -> Dict[str, Any]:
+    async def evaluate_content(self, content: str, original_task: str = None) -> Dict[str, Any]:
         """評估生成的內容"""
+        result = None
         try:
             # 格式化原始任務資訊
             original_task_str = original_task if original_task else "無原始任務描述"
@@ -83,31 +257,131 @@ Description: {data['parent']['description']}"""
                 original_task=original_task_str
             )
             
-            response = self.openai.chat.completions.create(
-                model="gpt-4o-mini-2024-07-18",
-                messages=[
-                    {"role": "system", "content": self.prompt_manager.get_system_prompt("content_evaluation")},
-                    {"role": "user", "content": user_prompt}
-                ],
-                response_format={"type": "json_object"},
-                max_tokens=2000,
-                temperature=0  # 設定為 0 以獲得更確定性的輸出
-            )
+            if self.cache is not None:
+                cache_key = self.cache.make_key(content, original_task_str, EVALUATION_MODEL)
+                cached = self.cache.get("eval", cache_key)
+                if cached is not None:
+                    return cached
+            
+            result = await self._request_evaluation(user_prompt)
+            evaluation = orjson.loads(result)
+            if self.cache is not None and self._is_valid_evaluation(evaluation):
+                self.cache.set("eval", cache_key, evaluation)
+            return evaluation
             
-            try:
-                result = response.choices[0].message.content
-                return json.loads(result)
-            except json.JSONDecodeError as e:
-                print(f"JSON 解析錯誤: {e}")
+        except orjson.JSONDecodeError as e:  # 為 json.JSONDecodeError 的子類別
+            print(f"JSON 解析錯誤: {e}")
+            if result is not None:
                 print(f"原始回應: {result[:200]}...")  # 只顯示前200個字符
-                return self._get_error_evaluation("JSON 解析失敗")
-                
+            return self._get_error_evaluation("JSON 解析失敗")
         except Exception as e:
             print(f"評估過程發生錯誤: {e}")
-            if 'result' in locals():
+            if result is not None:
                 print(f"原始回應: {result[:200]}...")  # 只顯示前200個字符
             return self._get_error_evaluation(str(e))
 
+    async def evaluate_batch(self, items: List[Tuple[str, Optional[str]]]) -> List[Dict[str, Any]]:
+        """
+        以單一請求評估多份內容，分攤 system prompt 與往返延遲
+        :param items: (content, original_task) 的列表
+        :return: 與 items 順序相同的評估結果
+        """
+        evaluations: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        pending = []  # (index, cache_key, item_prompt)
+        for index, (content, original_task) in enumerate(items):
+            original_task_str = original_task if original_task else "無原始任務描述"
+            cache_key = None
+            if self.cache is not None:
+                # 批次與單份評估的 prompt 不同，鍵中加入模式與批次 prompt，修改批次 prompt 後舊快取即失效
+                cache_key = self.cache.make_key(
+                    content, original_task_str, EVALUATION_MODEL,
+                    "batch", BATCH_EVALUATION_INSTRUCTION, BATCH_EVALUATION_ITEM_TEMPLATE
+                )
+                cached = self.cache.get("eval", cache_key)
+                if cached is not None:
+                    evaluations[index] = cached
+                    continue
+            # 每個項目只放動態欄位，避免重複單份評估模板中的輸出格式說明
+            item_prompt = BATCH_EVALUATION_ITEM_TEMPLATE.format(index=index, original_task=original_task_str, content=content)
+            pending.append((index, cache_key, item_prompt))
+        
+        if not pending:
+            return evaluations
+        
+        user_prompt = "\n\n".join(
+            [BATCH_EVALUATION_INSTRUCTION] + [item_prompt for _, _, item_prompt in pending]
+        )
+        results = {}
+        error_message = "批次結果缺少此項目"
+        try:
+            response_text = await self._request_evaluation(user_prompt, max_tokens=min(2000 * len(pending), 16000))
+            for result in orjson.loads(response_text).get("results", []):
+                if not isinstance(result, dict) or "index" not in result:
+                    continue
+                # 單一項目的 index 無法解析時只略過該項目，不影響其他已解析的結果
+                try:
+                    results[int(result.pop("index"))] = result
+                except (TypeError, ValueError):
+                    continue
+        except Exception as e:
+            print(f"批次評估過程發生錯誤: {e}")
+            error_message = str(e)
+        
+        for index, cache_key, _ in pending:
+            evaluation = results.get(index)
+            if evaluation is None:
+                evaluations[index] = self._get_error_evaluation(error_message)
+                continue
+            if not self._is_valid_evaluation(evaluation):
+                evaluations[index] = self._get_error_evaluation("批次結果格式不完整")
+                continue
+            if self.cache is not None:
+                self.cache.set("eval", cache_key, evaluation)
+            evaluations[index] = evaluation
+        return evaluations
+
+    # 僅在 rate limit、伺服器錯誤與連線錯誤時以指數退避重試
+    @retry(
+        retry=retry_if_exception_type((RateLimitError, InternalServerError, APIConnectionError)),
+        wait=wait_exponential(multiplier=1, max=30),
+        stop=stop_after_attempt(6),
+        reraise=True
+    )
+    async def _request_evaluation(self, user_prompt: str, max_tokens: int = 2000) -> str:
+        """
+        送出評估請求並回傳原始 JSON 字串
+        :param user_prompt: 包含待評估內容的 user message
+        :param max_tokens: 回應的最大 token 數
+        """
+        # 靜態的 system prompt 放在最前面，動態內容只放在 user message
+        response = await self.openai.chat.completions.create(
+            model=EVALUATION_MODEL,
+            messages=[
+                {"role": "system", "content": self.evaluation_system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            response_format={"type": "json_object"},
+            max_tokens=max_tokens,
+            temperature=0,  # 設定為 0 以獲得更確定性的輸出
+            prompt_cache_key=EVALUATION_SESSION_ID
+        )
+        self._record_openai_usage(response.usage)
+        return response.choices[0].message.content
+
+    def _record_openai_usage(self, usage) -> None:
+        """累計 OpenAI prompt token 與快取命中的 token 數"""
+        if usage is None:
+            return
+        self.openai_cache_stats["prompt_tokens"] += usage.prompt_tokens or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        if details is not None:
+            self.openai_cache_stats["cached_tokens"] += getattr(details, "cached_tokens", None) or 0
+
+    @staticmethod
+    def _is_valid_evaluation(evaluation: Any) -> bool:
+        """檢查評估結果是否包含必要欄位"""
+        return isinstance(evaluation, dict) and all(key in evaluation for key in REQUIRED_EVALUATION_KEYS)
+
     def _get_error_evaluation(self, error_message: str) -> Dict[str, Any]:
         """生成錯誤評估結果"""
         return {
@@ -120,30 +394,31 @@ Description: {data['parent']['description']}"""
             "acceptance_criteria": {"score": 0, "reason": "評估失敗"}
         }
 
-def print_evaluation(evaluation: Dict[str, Any]):
-    """Print evaluation results"""
-    print("-" * 50)
-    total_score = 0
+def print_evaluation(evaluation: Dict[str, Any], out: Optional[TextIO] = None):
+    """Print evaluation results
+    :param evaluation: The evaluation result
+    :param out: Writer to receive the output (defaults to sys.stdout); written in a single call
+    """
+    lines = ["-" * 50]
     
     # If overall_score is provided in the evaluation, use it directly
     if "overall_score" in evaluation:
-        print("\nScores:")
+        lines.append("\nScores:")
         for criterion, score in evaluation.get("scores", {}).items():
-            print(f"{criterion.capitalize()}: {score}/10")
-            print(f"Reason: {evaluation.get('reasons', {}).get(criterion, 'No reason provided')}")
-            print()
+            lines.append(f"{criterion.capitalize()}: {score}/10")
+            lines.append(f"Reason: {evaluation.get('reasons', {}).get(criterion, 'No reason provided')}")
+            lines.append("")
             
-        print("\nSuggestions for improvement:")
+        lines.append("\nSuggestions for improvement:")
         for suggestion in evaluation.get("suggestions", []):
-            print(f"- {suggestion}")
+            lines.append(f"- {suggestion}")
             
-        print("\nConsistency Check:")
-        print(evaluation.get("consistency_check", "No consistency check provided"))
+        lines.append("\nConsistency Check:")
+        lines.append(str(evaluation.get("consistency_check", "No consistency check provided")))
             
-        print("\nOverall Score:")
-        print(f"Total: {evaluation['overall_score']:.1f}/10")
-        print("-" * 50)
-        return evaluation['overall_score']
+        lines.append("\nOverall Score:")
+        lines.append(f"Total: {evaluation['overall_score']:.1f}/10")
+        total_score = evaluation['overall_score']
 
     else:
         # Fallback to old format with weights
@@ -160,48 +435,47 @@ def print_evaluation(evaluation: Dict[str, Any]):
         total_score = 0
         for criterion in weights.keys():
             if criterion in evaluation:
-                print(f"\n{criterion.capitalize()}:")
-                print(f"Score: {evaluation[criterion]['score']}/10")
-                print(f"Reason: {evaluation[criterion]['reason']}")
+                lines.append(f"\n{criterion.capitalize()}:")
+                lines.append(f"Score: {evaluation[criterion]['score']}/10")
+                lines.append(f"Reason: {evaluation[criterion]['reason']}")
                 total_score += evaluation[criterion]['score'] * weights[criterion]
         
-        print("\nWeighted Average Score:")
-        print(f"Total: {total_score:.1f}/10")
+        lines.append("\nWeighted Average Score:")
+        lines.append(f"Total: {total_score:.1f}/10")
     
-        print("-" * 50)
-        return total_score
+    lines.append("-" * 50)
+    (out if out is not None else sys.stdout).write("\n".join(lines) + "\n")
+    return total_score
 
 def calculate_average_scores(evaluations):
     """計算評估結果的平均分數"""
-    total_scores = {
-        "relevance": 0,
-        "clarity": 0,
-        "completeness": 0,
-        "actionable": 0
-    }
-    count = 0
+    # numpy 只在此處使用，延後匯入以免增加模組載入時間
+    import numpy as np
     
-    for eval in evaluations:
-        if isinstance(eval, dict) and "scores" in eval:
-            scores = eval["scores"]
-            if all(key in scores for key in ["相關性", "清晰性", "完整性", "可執行性"]):
-                total_scores["relevance"] += float(scores["相關性"])
-                total_scores["clarity"] += float(scores["清晰性"])
-                total_scores["completeness"] += float(scores["完整性"])
-                total_scores["actionable"] += float(scores["可執行性"])
-                count += 1
+    keys = ["relevance", "clarity", "completeness", "actionable"]
+    score_keys = ["相關性", "清晰性", "完整性", "可執行性"]
     
-    if count == 0:
-        return {k: 0 for k in total_scores}, 0
-        
-    avg_scores = {k: round(v/count, 2) for k, v in total_scores.items()}
-    overall_avg = round(sum(avg_scores.values()) / len(avg_scores), 2)
+    rows = [
+        [float(eval["scores"][key]) for key in score_keys]
+        for eval in evaluations
+        if isinstance(eval, dict) and "scores" in eval and all(key in eval["scores"] for key in score_keys)
+    ]
+    
+    if not rows:
+        return {k: 0 for k in keys}, 0
+    
+    # 以 (N, 4) 陣列一次計算各項平均
+    avg = np.round(np.array(rows, dtype=np.float64).mean(axis=0), 2)
+    avg_scores = dict(zip(keys, avg.tolist()))
+    overall_avg = round(float(avg.mean()), 2)
     return avg_scores, overall_avg
 
-def test_enrich_task(show_details=False):
+async def test_enrich_task(show_details=False, max_concurrency=5, use_cache=True):
     """測試任務豐富化內容生成
     Args:
         show_details (bool): 是否顯示詳細的生成內容和評估結果
+        max_concurrency (int): 同時執行的測試案例數上限，避免觸發 API rate limit
+        use_cache (bool): 是否使用磁碟快取略過相同輸入的 API 呼叫
     """
     test_cases = [
         {
@@ -262,65 +536,117 @@ def test_enrich_task(show_details=False):
     ]
     
     prompt_manager = PromptManager("prompts.json")
-    evaluator = ContentEvaluator(prompt_manager)
-    
-    comprehensive_evaluations = []
-    concise_evaluations = []
-    
-    for test_case in test_cases:
-        if show_details:
-            print(f"\n\n測試案例: {test_case['name']}")
-            print("=" * 50)
+    cache = EvalCache.for_prompt_file(prompt_manager.prompt_file) if use_cache else None
+    # 連線池綁定目前的 event loop，於本次執行結束前關閉
+    async with create_http_client() as http_client:
+        evaluator = ContentEvaluator(prompt_manager, cache=cache, http_client=http_client)
         
-        # 測試 comprehensive prompt
-        if show_details:
-            print("\n使用 Comprehensive Prompt:")
-            print("-" * 50)
-        content = evaluator.generate_content(test_case["task_info"], style="comprehensive")
-        if show_details:
-            print("生成的內容：")
-            print(content)
-            print("-" * 50)
-        evaluation = evaluator.evaluate_content(content, json.dumps(test_case["task_info"]))
-        comprehensive_evaluations.append(evaluation)
-        if show_details:
-            print("\n評估結果：")
-            comprehensive_score = print_evaluation(evaluation)
+        semaphore = asyncio.Semaphore(max_concurrency)
         
-        # 測試 concise prompt
-        if show_details:
-            print("\n使用 Concise Prompt 生成內容:")
-        concise_content = evaluator.generate_content(test_case["task_info"], style="concise")
-        if show_details:
-            print(concise_content)
-            print("\n評估 Concise Prompt 生成的內容:")
+        async def run_case(test_case):
+            """生成單一測試案例的 comprehensive 與 concise 內容"""
+            async with semaphore:
+                # 兩種風格的生成互不相依，同時送出
+                content, concise_content = await asyncio.gather(
+                    evaluator.generate_content(test_case["task_info"], style="comprehensive"),
+                    evaluator.generate_content(test_case["task_info"], style="concise")
+                )
+            return content, concise_content
+        
+        # 先完成第一個案例 (每個 system prompt 各一個請求) 寫入 Anthropic prompt cache，
+        # 其餘案例再並行生成，才能讀取快取而不是每個請求都付快取建立的費用
+        first_contents = await run_case(test_cases[0])
+        contents = [first_contents] + list(await asyncio.gather(*[run_case(test_case) for test_case in test_cases[1:]]))
+        
+        # 原始任務資訊每個測試案例只序列化一次，兩種風格共用同一字串
+        original_tasks = [orjson.dumps(test_case["task_info"]).decode() for test_case in test_cases]
+        
+        # 每種風格的所有內容以一次批次請求評估
+        comprehensive_evaluations, concise_evaluations = await asyncio.gather(
+            evaluator.evaluate_batch([
+                (content, original_task)
+                for (content, _), original_task in zip(contents, original_tasks)
+            ]),
+            evaluator.evaluate_batch([
+                (concise_content, original_task)
+                for (_, concise_content), original_task in zip(contents, original_tasks)
+            ])
+        )
+    
+    if show_details:
+        for test_case, (content, concise_content), evaluation, concise_evaluation in zip(
+            test_cases, contents, comprehensive_evaluations, concise_evaluations
+        ):
+            # 每個測試案例的輸出先寫入緩衝區，再一次寫到 stdout
+            buf = io.StringIO()
+            buf.write("\n".join([
+                f"\n\n測試案例: {test_case['name']}",
+                "=" * 50,
+                # 測試 comprehensive prompt
+                "\n使用 Comprehensive Prompt:",
+                "-" * 50,
+                "生成的內容：",
+                content,
+                "-" * 50,
+                "\n評估結果：",
+            ]) + "\n")
+            comprehensive_score = print_evaluation(evaluation, out=buf)
             
-        evaluation = evaluator.evaluate_content(concise_content, test_case["task_info"].get("description"))
-        concise_evaluations.append(evaluation)
-        if show_details:
-            print("\n評估結果：")
-            concise_score = print_evaluation(evaluation)
+            # 測試 concise prompt
+            buf.write("\n".join([
+                "\n使用 Concise Prompt 生成內容:",
+                concise_content,
+                "\n評估 Concise Prompt 生成的內容:",
+                "\n評估結果：",
+            ]) + "\n")
+            concise_score = print_evaluation(concise_evaluation, out=buf)
             
             # 計算並顯示平均分數
-            print("\n綜合評分比較:")
-            print("=" * 50)
-            print(f"Comprehensive Score: {comprehensive_score:.1f}")
-            print(f"Concise Score: {concise_score:.1f}")
-            print("=" * 50)
+            buf.write("\n".join([
+                "\n綜合評分比較:",
+                "=" * 50,
+                f"Comprehensive Score: {comprehensive_score:.1f}",
+                f"Concise Score: {concise_score:.1f}",
+                "=" * 50,
+            ]) + "\n")
+            sys.stdout.write(buf.getvalue())
     
-    # 計算並顯示所有測試案例的平均分數
-    comprehensive_avg = sum([evaluation["overall_score"] for evaluation in comprehensive_evaluations]) / len(comprehensive_evaluations)
-    concise_avg = sum([evaluation["overall_score"] for evaluation in concise_evaluations]) / len(concise_evaluations)
+    # 計算並顯示所有測試案例的平均分數，評估失敗 (無 overall_score) 的案例不列入
+    comprehensive_scores = [evaluation["overall_score"] for evaluation in comprehensive_evaluations if "overall_score" in evaluation]
+    concise_scores = [evaluation["overall_score"] for evaluation in concise_evaluations if "overall_score" in evaluation]
+    comprehensive_avg = sum(comprehensive_scores) / len(comprehensive_scores) if comprehensive_scores else 0
+    concise_avg = sum(concise_scores) / len(concise_scores) if concise_scores else 0
     print("\n所有測試案例的平均分數:")
     print("=" * 50)
     print(f"Comprehensive Average Score: {comprehensive_avg:.1f}")
     print(f"Concise Average Score: {concise_avg:.1f}")
+    print(f"Failed Evaluations: {len(comprehensive_evaluations) - len(comprehensive_scores)} comprehensive, {len(concise_evaluations) - len(concise_scores)} concise")
+    print("=" * 50)
+    
+    # 顯示 Claude system prompt 快取命中情況；全部由磁碟快取提供時不會建立 Claude client
+    if "claude" in evaluator.__dict__:
+        cache_stats = evaluator.claude.cache_stats
+        print("\nClaude Prompt Cache:")
+        print(f"Cache Read Tokens: {cache_stats['cache_read_input_tokens']}")
+        print(f"Cache Creation Tokens: {cache_stats['cache_creation_input_tokens']}")
+        print(f"Cache Hit Rate: {evaluator.claude.cache_hit_rate():.1%}")
+        print("=" * 50)
+    
+    # 顯示 OpenAI 評估 prompt 快取命中情況
+    openai_stats = evaluator.openai_cache_stats
+    openai_hit_rate = openai_stats["cached_tokens"] / openai_stats["prompt_tokens"] if openai_stats["prompt_tokens"] else 0.0
+    print("\nOpenAI Prompt Cache:")
+    print(f"Cached Tokens: {openai_stats['cached_tokens']}/{openai_stats['prompt_tokens']}")
+    print(f"Cache Hit Rate: {openai_hit_rate:.1%}")
     print("=" * 50)
 
 def main():
     """主程序"""
+    # 有安裝 uvloop 時以其取代預設的 event loop
+    if uvloop is not None:
+        uvloop.install()
     # 執行任務豐富化測試，可以通過參數控制是否顯示詳細信息
-    test_enrich_task(show_details=True)  
+    asyncio.run(test_enrich_task(show_details=True), debug=False)
 
 if __name__ == "__main__":
     main()